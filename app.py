@@ -1,19 +1,120 @@
+import asyncio
+import hmac
 import os
 import logging
-from flask import Flask, request, jsonify
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+
+import httpx
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from groq import GroqError
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+app = FastAPI()
+
+# Static part of the LLM instructions, built once at import. Only the date
+# changes between calls, so it stays a {current_date} placeholder.
+SYSTEM_PROMPT_TEMPLATE = (
+    "Your input is a transaction message extracted from voice. Extract structured details like Amount, "
+    "Transaction Type, Bank Name, Card Type, Paid To, Merchant, Transaction Mode, Transaction Date, Reference Number, and Tag. "
+    "Transaction Type should be consistent: either 'debit' or 'credit'. "
+    "Transaction date format should be 'dd/mm/yy'. "
+    "Tag means the category of spending: e.g., if Amazon, then Shopping; if Zomato, then Eating. "
+    "Just return the JSON output only. Don't say anything else. If no output, return null. "
+    "If the mode of payment is not mentioned, assume 'cash' by default. "
+    "If any field is missing, set it as null. "
+    "Return only a JSON or a list of JSON objects. "
+    "Handle unstructured, grammatically incorrect, and short human input. "
+    "Example: 'today I spent 500 at Domino's' should be extracted correctly. "
+    "If the user mentions multiple items with multiple prices, generate a list of JSON objects. "
+    """
+        Today's date is {current_date}. You must use this date when interpreting time-related queries.
+        For example:
+        - If a user says "this month," assume it is the current month.
+        """
+)
+
+
+@lru_cache(maxsize=2)
+def _today_str(ordinal):
+    """Format a day ordinal as YYYY-MM-DD (cached so strftime runs once a day)."""
+    return date.fromordinal(ordinal).strftime('%Y-%m-%d')
+
+
+@lru_cache(maxsize=2)
+def _rendered_system_prompt(ordinal):
+    """Render the system prompt for a given day ordinal (cached per day)."""
+    return SYSTEM_PROMPT_TEMPLATE.format(current_date=_today_str(ordinal))
+
 
-# Set current date
-current_date = datetime.today().strftime('%Y-%m-%d')
+def get_system_prompt():
+    """Return today's system prompt, re-rendered only when the date rolls over."""
+    return _rendered_system_prompt(date.today().toordinal())
+
+
+# Prebuilt chat prompt, piped into the LLM once as a Runnable chain. The
+# system message is a single variable so the daily-cached rendered prompt
+# slots in without re-formatting the whole template per call.
+PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", "{system_prompt}"),
+        ("human", "{message}"),
+    ]
+)
 
 API_SECRET_KEY = os.getenv("API_SECRET_KEY")
+# Built once so auth checks don't re-format the expected header per request.
+# Kept as bytes for hmac.compare_digest, which compares in constant time.
+_EXPECTED_AUTH = f"Bearer {API_SECRET_KEY}".encode()
+
+
+def is_authorized(auth_header):
+    """Check an Authorization header against the expected bearer token."""
+    return bool(auth_header) and hmac.compare_digest(
+        auth_header.encode(), _EXPECTED_AUTH
+    )
+
+
+_UNAUTHORIZED_BODY = b'{"error": "Unauthorized"}'
+
+
+class AuthMiddleware:
+    """Raw ASGI middleware rejecting bad bearer tokens before routing.
+
+    Unauthorized requests get their 401 straight from the transport layer,
+    skipping the router, body handling, and endpoint machinery entirely —
+    cheap insurance against scanning bots.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            auth_header = dict(scope["headers"]).get(b"authorization")
+            if auth_header is None or not hmac.compare_digest(auth_header, _EXPECTED_AUTH):
+                await send({
+                    "type": "http.response.start",
+                    "status": 401,
+                    "headers": [(b"content-type", b"application/json")],
+                })
+                await send({"type": "http.response.body", "body": _UNAUTHORIZED_BODY})
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(AuthMiddleware)
 
 # API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -21,6 +122,32 @@ DEFAULT_MODEL = "llama3-70b-8192"
 DEFAULT_TEMPERATURE = 0.5
 DEFAULT_MAX_TOKENS = 1024
 
+# Micro-batching: prompts arriving within the window are coalesced into a
+# single llm.abatch call so HTTP/TLS overhead amortizes across requests.
+MAX_BATCH = 16
+BATCH_WINDOW_SECONDS = 0.05
+
+# Reject oversized /process bodies before spending any time parsing them.
+MAX_BODY_BYTES = 16 * 1024
+
+# Truncate messages before invocation (~1k tokens) rather than paying
+# bandwidth and Groq compute only to have the API reject the prompt.
+MAX_MSG_CHARS = 4000
+
+# Cap in-flight Groq calls so bursts queue locally instead of triggering
+# upstream rate limits and retry storms.
+GROQ_MAX_CONCURRENCY = 32
+GROQ_MAX_RETRIES = 3
+
+# Voice pipelines re-submit identical text often (retries, echo); an LRU of
+# message -> response turns those repeats into dict lookups instead of
+# full Groq round-trips.
+RESPONSE_CACHE_SIZE = 4096
+
+# Keep only the most recent batch jobs so a long-running worker doesn't
+# accumulate job results forever; old jobs age out oldest-first.
+MAX_BATCH_JOBS = 256
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -33,82 +160,300 @@ def initialize_rag_system():
         return None
     try:
         logger.info("Initializing LLM system...")
+        # A generously sized keep-alive pool with HTTP/2 lets the many
+        # concurrent Groq calls multiplex over warm connections instead of
+        # paying a TCP/TLS handshake each.
+        http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=90,
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            http2=True,
+        )
         return ChatGroq(
             api_key=GROQ_API_KEY,
             model=DEFAULT_MODEL,
             temperature=DEFAULT_TEMPERATURE,
             max_tokens=DEFAULT_MAX_TOKENS,
+            http_async_client=http_async_client,
         )
     except Exception as e:
         logger.exception("Failed to initialize LLM system: %s", str(e))
         return None
 
+
+_llm_lock = threading.Lock()
+_llm_instance = None
+
+
+def get_llm():
+    """Return the shared ChatGroq instance, building it at most once.
+
+    Double-checked locking so a burst of cold-start requests can't race
+    into constructing duplicate clients (and connection pools).
+    """
+    global _llm_instance
+    if _llm_instance is None:
+        with _llm_lock:
+            if _llm_instance is None:
+                _llm_instance = initialize_rag_system()
+    return _llm_instance
+
+
+_chain = None
+
+
+def get_chain():
+    """Return the shared PROMPT | llm chain, building it at most once."""
+    global _chain
+    if _chain is None:
+        llm = get_llm()
+        if llm is not None:
+            _chain = PROMPT | llm
+    return _chain
+
+# Micro-batching queue: (chain input, Future) pairs drained by _drain_batches.
+_batch_queue: asyncio.Queue = asyncio.Queue()
+_batcher_task = None
+
+_groq_semaphore = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+
+# LRU of message hash -> LLM response (OrderedDict, oldest entry evicted).
+_response_cache: OrderedDict = OrderedDict()
+
+
+def _cache_key(message):
+    """Hash a message plus the current day to a compact, fixed-size cache key.
+
+    Responses embed dates the model resolves against today's system prompt
+    ("today I spent 500..." becomes a concrete dd/mm/yy), so entries must not
+    survive a date rollover; keying on the day ordinal retires them at midnight.
+    """
+    day_and_message = f"{date.today().toordinal()}:{message}"
+    return blake2b(day_and_message.encode(), digest_size=16).hexdigest()
+
+
+async def _abatch_limited(runnable, inputs):
+    """Batch-invoke a runnable under the concurrency cap, backing off on rate limits."""
+    for attempt in range(GROQ_MAX_RETRIES):
+        try:
+            # Acquire per attempt so the backoff sleep below happens without
+            # holding a permit — a rate-limited call shouldn't block a slot.
+            async with _groq_semaphore:
+                return await runnable.abatch(inputs)
+        except GroqError as e:
+            if getattr(e, "status_code", None) != 429 or attempt == GROQ_MAX_RETRIES - 1:
+                raise
+            delay = 2 ** attempt
+            logger.warning("Rate limited by Groq; retrying in %ds...", delay)
+            await asyncio.sleep(delay)
+
+
+async def _dispatch_batch(chain, batch):
+    """Send one collected batch to the LLM and resolve its futures."""
+    try:
+        responses = await _abatch_limited(chain, [chain_input for chain_input, _ in batch])
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for (_, future), response in zip(batch, responses):
+        if not future.done():
+            future.set_result(response)
+
+
+async def _drain_batches():
+    """Background task coalescing queued chain inputs into batched LLM calls."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_SECONDS
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Fire the batch off and keep draining immediately: batches run
+        # concurrently, capped by the Groq semaphore, instead of the whole
+        # service serializing behind one in-flight call.
+        asyncio.create_task(_dispatch_batch(get_chain(), batch))
+
+
+async def _invoke_batched(chain_input):
+    """Queue a chain input for the next batch and wait for its response."""
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((chain_input, future))
+    return await future
+
+
+@app.on_event("startup")
+async def _start_batcher():
+    global _batcher_task
+    _batcher_task = asyncio.create_task(_drain_batches())
+
+
 # Process Transaction Message
-def process_transaction_message(message, llm):
+async def process_transaction_message(message, llm):
     """Process the message using LLM and return structured JSON."""
     if llm is None:
         logger.error("LLM system is not initialized.")
         return {"error": "LLM system is not initialized."}
 
-    system_prompt = (
-        "Your input is a transaction message extracted from voice. Extract structured details like Amount, "
-        "Transaction Type, Bank Name, Card Type, Paid To, Merchant, Transaction Mode, Transaction Date, Reference Number, and Tag. "
-        "Transaction Type should be consistent: either 'debit' or 'credit'. "
-        "Transaction date format should be 'dd/mm/yy'. "
-        "Tag means the category of spending: e.g., if Amazon, then Shopping; if Zomato, then Eating. "
-        "Just return the JSON output only. Don't say anything else. If no output, return null. "
-        "If the mode of payment is not mentioned, assume 'cash' by default. "
-        "If any field is missing, set it as null. "
-        "Return only a JSON or a list of JSON objects. "
-        "Handle unstructured, grammatically incorrect, and short human input. "
-        "Example: 'today I spent 500 at Domino's' should be extracted correctly. "
-        "If the user mentions multiple items with multiple prices, generate a list of JSON objects. "
-        f"""
-        Today's date is {current_date}. You must use this date when interpreting time-related queries.
-        For example:
-        - If a user says "this month," assume it is the current month.
-        """
-    )
+    if len(message) > MAX_MSG_CHARS:
+        logger.warning("Message truncated from %d to %d chars.", len(message), MAX_MSG_CHARS)
+        message = message[:MAX_MSG_CHARS]
+
+    cache_key = _cache_key(message)
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        _response_cache.move_to_end(cache_key)
+        logger.debug("Response cache hit.")
+        return cached
+
+    chain_input = {"system_prompt": get_system_prompt(), "message": message}
 
-    input_prompt = f"{system_prompt}\nMessage: {message}"
-    
     try:
         logger.info("Sending request to LLM...")
-        response = llm.invoke(input_prompt)
+        response = await _invoke_batched(chain_input)
         logger.info("Received response from LLM.")
-        return response.content if hasattr(response, "content") else response
-    except Exception as e:
-        logger.exception("Error processing transaction message: %s", str(e))
+        result = getattr(response, "content", response)
+        _response_cache[cache_key] = result
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+        return result
+    except (GroqError, httpx.HTTPError) as e:
+        # Known upstream failures (rate limits, transport errors): log without
+        # the traceback capture; the endpoint's handler stays the safety net.
+        logger.error("LLM request failed: %s", e)
         return {"error": str(e)}
 
 # API Endpoint for Backend to Send Input
-@app.route("/process", methods=["POST"])
-def process_text():
+@app.post("/process")
+async def process_text(request: Request):
     """API endpoint to process transaction messages."""
     try:
         # Authorization Check
         auth_header = request.headers.get("Authorization")
-        if not auth_header or auth_header != f"Bearer {API_SECRET_KEY}":
-            return jsonify({"error": "Unauthorized"}), 401
+        if not is_authorized(auth_header):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
 
-        # Validate Request Data
-        data = request.get_json()
+        # Validate Request Data: reject on the declared length before
+        # buffering the body, so oversized uploads never reach memory.
+        content_length = request.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_BODY_BYTES:
+            logger.warning("Invalid request: Body exceeds %d bytes.", MAX_BODY_BYTES)
+            return JSONResponse({"error": "Request body too large"}, status_code=413)
+        raw = await request.body()
+        # Backstop for chunked or mis-declared lengths.
+        if len(raw) > MAX_BODY_BYTES:
+            logger.warning("Invalid request: Body exceeds %d bytes.", MAX_BODY_BYTES)
+            return JSONResponse({"error": "Request body too large"}, status_code=413)
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            data = None
         if not data or "text" not in data:
             logger.warning("Invalid request: Missing 'text' parameter.")
-            return jsonify({"error": "Missing 'text' parameter"}), 400
+            return JSONResponse({"error": "Missing 'text' parameter"}, status_code=400)
 
-        logger.info("Processing transaction message: %s", data["text"])
-        llm = initialize_rag_system()
+        logger.debug("Processing transaction message: %s", data["text"])
+        llm = get_llm()
         if llm is None:
-            return jsonify({"error": "LLM initialization failed"}), 500
+            return JSONResponse({"error": "LLM initialization failed"}, status_code=500)
 
-        json_output = process_transaction_message(data["text"], llm)
-        return jsonify(json_output)
+        json_output = await process_transaction_message(data["text"], llm)
+        # The LLM already returns a JSON string; send it as-is instead of
+        # re-parsing/re-serializing it through jsonify-style encoding.
+        if isinstance(json_output, str):
+            return Response(json_output, media_type="application/json")
+        return Response(orjson.dumps(json_output), media_type="application/json")
 
     except Exception as e:
         logger.exception("Unexpected error in /process endpoint: %s", str(e))
-        return jsonify({"error": str(e)}), 500
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+# In-memory store of batch jobs, keyed by UUID: {"status": ..., "results": ...}
+# Capped at MAX_BATCH_JOBS entries, oldest submission evicted first.
+_batch_jobs: OrderedDict = OrderedDict()
+
+
+async def _run_batch_job(job_id, texts):
+    """Run a submitted batch job and record its outcome."""
+    chain = get_chain()
+    system_prompt = get_system_prompt()
+    inputs = [{"system_prompt": system_prompt, "message": text} for text in texts]
+    try:
+        responses = await _abatch_limited(chain, inputs)
+        _batch_jobs[job_id] = {
+            "status": "completed",
+            "results": [
+                getattr(response, "content", response) for response in responses
+            ],
+        }
+    except (GroqError, httpx.HTTPError) as e:
+        logger.error("Batch job %s failed: %s", job_id, e)
+        _batch_jobs[job_id] = {"status": "failed", "error": str(e)}
+    except Exception as e:
+        logger.exception("Batch job %s failed: %s", job_id, str(e))
+        _batch_jobs[job_id] = {"status": "failed", "error": str(e)}
+
+
+# Batch Endpoint for Non-Time-Sensitive Callers
+@app.post("/process_batch")
+async def process_batch(request: Request):
+    """Submit a list of texts as one asynchronous batch job."""
+    try:
+        auth_header = request.headers.get("Authorization")
+        if not is_authorized(auth_header):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        texts = data.get("texts") if isinstance(data, dict) else None
+        if not texts or not isinstance(texts, list):
+            logger.warning("Invalid request: Missing 'texts' parameter.")
+            return JSONResponse({"error": "Missing 'texts' parameter"}, status_code=400)
+
+        llm = get_llm()
+        if llm is None:
+            return JSONResponse({"error": "LLM initialization failed"}, status_code=500)
+
+        job_id = uuid.uuid4().hex
+        _batch_jobs[job_id] = {"status": "pending"}
+        while len(_batch_jobs) > MAX_BATCH_JOBS:
+            _batch_jobs.popitem(last=False)
+        asyncio.create_task(_run_batch_job(job_id, texts))
+        return JSONResponse({"job_id": job_id, "status": "pending"}, status_code=202)
+
+    except Exception as e:
+        logger.exception("Unexpected error in /process_batch endpoint: %s", str(e))
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# Poll the Result of a Batch Job
+@app.get("/result/{job_id}")
+async def get_result(job_id: str, request: Request):
+    """Return the status (and results, once completed) of a batch job."""
+    auth_header = request.headers.get("Authorization")
+    if not is_authorized(auth_header):
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+
+    job = _batch_jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job id"}, status_code=404)
+    return JSONResponse(job)
 
 if __name__ == "__main__":
-    logger.info("Starting Flask API server...")
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 8080)), debug=False)
+    import uvicorn
+
+    logger.info("Starting API server...")
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8080)))